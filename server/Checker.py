@@ -3,15 +3,20 @@ import pandas as pd
 import os
 from bs4 import BeautifulSoup
 from requests.exceptions import ConnectionError
+from WaveClient import shared_client
 
 class Checker(object):
     """
     Checks content for any accessibility errors and reports out the exact
     location as best as it can
     """
-    def __init__(self):
+    def __init__(self, client=None):
         self._wave_key = "" #fill in with your WAVE API KEY
         self.DATA_FILE = 'data/sample_errors.csv'
+        
+        # all the Checkers share one client unless told otherwise, so
+        # duplicate requests for the same URL only hit WAVE once
+        self._client = client if client is not None else shared_client
         return
         
     def check(self, url):
@@ -25,18 +30,9 @@ class Checker(object):
             a list of dicts (containing all the errors found by WAVE API)
         """
         
-        wave_url = "https://wave.webaim.org/api/request?key=%s&url=%s&reporttype=4" % (
-                        self._wave_key, url
-                    )
-        response = requests.get(wave_url)
-        
-        if response.status_code != 200:
-            msg = "could not send URL to WAVE! Response: %s" % response.text
-            raise Exception(msg)
+        content = self._client.get(self._wave_key, url)
         
         # parse out the errors, contrast, and alerts
-        content = response.json()
-        
         contrast_errors = self.get_contrast_errors(content)
         errors          = self.get_errors(content, 'error')
         warnings        = self.get_errors(content, 'alert')
@@ -14,12 +14,17 @@ nlp.add_pipe(LanguageDetector(), name='language_detector', last=True)
 class Fixer(object):
 
 
-    def __init__(self):
+    def __init__(self, contrast_stylesheet=False):
+        """
+        Input:
+            contrast_stylesheet: if True, contrast fixes go into one shared
+                <style> block (one class per color) instead of inline styles
+        """
     
         # create the supported fixers
         
         self.fixers = {
-            'contrast': ContrastFixer(),
+            'contrast': ContrastFixer(use_stylesheet=contrast_stylesheet),
             'link_empty': EmptyLinkFixer(),
             'button_empty': EmptyLinkFixer(),
             'text_small'  : FontSizeFixer(),
@@ -41,11 +46,29 @@ class Fixer(object):
         Output:
             a string of better HTML
         """
+        better_html, num_fixed = self.fix_and_count(errors, html)
+        return better_html
+        
+    def fix_and_count(self, errors, html):
+        """
+        Same as fix_all, but also reports how many errors actually got
+        fixed (errors with no subfixer, or whose selector no longer
+        matches, don't count)
+        
+        Output:
+            a tuple of (string of better HTML, number of errors fixed)
+        """
     
         # first, make a soup of HTML
         #html = html.lower() # pre process to make the same
         soup = BeautifulSoup(html, 'lxml')
+        
+        # clear out anything left over from the last page (even if that
+        # page blew up before finish() got to run)
+        for subfixer in list(self.fixers.values()) + [self.default_fixer]:
+            subfixer.reset()
     
+        num_fixed = 0
         for error in errors:
             print("working on error of type %s" % error['type'])
             
@@ -73,6 +96,8 @@ class Fixer(object):
                         
                     # get the better window
                     better_window = subfixer.fix(error, window) # make this not HTML
+                    if subfixer is not self.default_fixer:
+                        num_fixed += 1
                     
                     
                     # replace the old window with the new in the html
@@ -82,8 +107,12 @@ class Fixer(object):
                     
             except Exception as e:
                 print("couldnt find this window! " + str(e))
+        
+        # let the subfixers do any page-wide work (like adding a stylesheet)
+        for subfixer in list(self.fixers.values()) + [self.default_fixer]:
+            subfixer.finish(soup)
             
-        return str(soup)
+        return str(soup), num_fixed
         
         
 class SubFixer(object):
@@ -110,6 +139,23 @@ class SubFixer(object):
         print("No subfixer implemented; returning the window as is")
     
         return window
+        
+    def reset(self):
+        """
+        Called at the start of every page, so subfixers that keep per-page
+        state (since they get reused) can clear it out
+        """
+        return
+        
+    def finish(self, soup):
+        """
+        Called once after all the errors on a page have been fixed, in
+        case the subfixer needs to make page-wide changes.
+        
+        Input:
+            soup: the BeautifulSoup of the whole page
+        """
+        return
     
     
     
@@ -235,6 +281,35 @@ class EmptyLinkFixer(SubFixer):
        
     
 class ContrastFixer(SubFixer):
+    """
+    Fixer specialized in bumping up the contrast of text by lightening or
+    darkening the foreground color.
+    
+    By default it adds an inline style to every failing element. With
+    use_stylesheet, each distinct new color gets its own class in a single
+    <style> block in the <head>, and the elements just get the class name,
+    so the page grows with the number of colors and not the number of elements.
+    
+    The stylesheet rules are weaker than an inline !important, though. We
+    scope them as "html body .cls.cls" and fall back to inline styles when
+    the element's own style already forces a color, but the page can still
+    win with a more specific !important rule (e.g. "#nav a") or an equally
+    specific one that comes later (e.g. a <style> in the <body>).
+    
+    Like inline mode, if an element has more than one contrast error the
+    last one wins (its class replaces the earlier one).
+    """
+    
+    CLASS_PREFIX = 'a11y-contrast-'
+    
+    def __init__(self, use_stylesheet=False):
+        self.use_stylesheet = use_stylesheet
+        self._classes = {} # css color string -> class name (for this page)
+        return
+        
+    def reset(self):
+        self._classes = {}
+        return
 
     def _hex_to_rgb(self, color):
         """
@@ -338,7 +413,79 @@ class ContrastFixer(SubFixer):
 
     def fix(self, error, window):
     
-        contrast = error['ratio']
+        fg_str = self._fixed_color(error)
+        
+        # a class can't beat an inline !important color, so only use the
+        # stylesheet when the element doesn't already force one
+        forced = re.search(r'(^|;)\s*color\s*:[^;]*!\s*important',
+                           window.get('style', ''), re.IGNORECASE)
+        
+        if self.use_stylesheet and not forced:
+            # reuse the class if we've already seen this color on the page
+            if fg_str not in self._classes:
+                self._classes[fg_str] = self.CLASS_PREFIX + str(len(self._classes))
+            
+            # drop any class from an earlier contrast error, so the last
+            # error wins just like it does with inline styles
+            classes = [c for c in window.get('class', [])
+                       if not c.startswith(self.CLASS_PREFIX)]
+            window['class'] = classes + [self._classes[fg_str]]
+            return window
+    
+        # create a window with our new data
+        if 'style' in window.attrs:
+            window['style'] += ';color: %s !important;' % fg_str
+        else:
+            window['style'] = 'color: %s !important;' % fg_str
+            
+        # note we don't actually have to return because BS is pass by reference, so we
+        # just changed the original HTML
+        return window
+        
+    def finish(self, soup):
+        """
+        Adds one <style> block to the <head> with a rule for each class
+        handed out by fix() that an element still uses (a class can get
+        replaced by a later error on the same element)
+        """
+        if len(self._classes) == 0:
+            return
+        
+        used = set()
+        for element in soup.find_all(class_=True):
+            used.update(element['class'])
+        
+        # "html body" and the doubled class bump up the specificity, so
+        # we beat most of the page's own !important color rules
+        rules = ['html body .%s.%s { color: %s !important; }' % (name, name, color)
+                 for color, name in self._classes.items() if name in used]
+        if len(rules) == 0:
+            return
+        
+        style = soup.new_tag('style')
+        style.string = '\n'.join(rules)
+        
+        # find (or make) the head to put it in
+        head = soup.find('head')
+        if head is None:
+            head = soup.new_tag('head')
+            html = soup.find('html')
+            if html is not None:
+                html.insert(0, head)
+            else:
+                soup.insert(0, head)
+        head.append(style)
+        return
+        
+    def _fixed_color(self, error):
+        """
+        Works out the new foreground color for this contrast error
+        
+        Input:
+            error: a dict with 'background' and 'foreground' hex colors
+        Output:
+            a CSS hsl() string of the better foreground color
+        """
         bg = error['background']
         fg = error['foreground']
 
@@ -360,17 +507,7 @@ class ContrastFixer(SubFixer):
             
         
         # convert the new fg hsl to a string
-        fg_str = self._stringify_hsl(fg_hsl) 
-    
-        # create a window with our new data
-        if 'style' in window.attrs:
-            window['style'] += ';color: %s !important;' % fg_str
-        else:
-            window['style'] = 'color: %s !important;' % fg_str
-            
-        # note we don't actually have to return because BS is pass by reference, so we
-        # just changed the original HTML
-        return window
+        return self._stringify_hsl(fg_hsl) 
         
         
 class FontSizeFixer(SubFixer):
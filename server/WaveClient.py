@@ -0,0 +1,167 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+
+class WaveClient(object):
+    """
+    Shared client for talking to the WAVE API. Sits underneath the Checker
+    so that every request handler goes through the same place, which lets us:
+        1. merge concurrent requests for the same URL into one call
+           (single-flight), so we don't pay WAVE credits twice
+        2. cap how many WAVE calls are out at once with a semaphore
+        3. keep a short-lived cache of responses (with a size limit)
+
+    Every caller gets its own copy of the report, so it's safe to change it.
+    """
+
+    WAVE_URL = "https://wave.webaim.org/api/request?key=%s&url=%s&reporttype=4"
+
+    def __init__(self, max_concurrent=4, cache_ttl=300, cache_size=128,
+                 timeout=30, wait_timeout=120):
+        """
+        Input:
+            max_concurrent: max number of WAVE calls in flight at once
+            cache_ttl: seconds to keep a response around (0 turns it off)
+            cache_size: max number of responses to keep in the cache
+            timeout: seconds to wait on WAVE (and for a free slot) before
+                giving up, so a stuck call can't hold things up forever
+            wait_timeout: seconds to wait on somebody else's call for the
+                same URL. requests applies timeout to the connect and to
+                each read separately, so a call can take longer than
+                timeout; keep this comfortably above it.
+        """
+        self.max_concurrent = max_concurrent
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.timeout = timeout
+        self.wait_timeout = wait_timeout
+
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()  # key -> (expires_at, content)
+        self._in_flight = {}         # key -> _Call
+        return
+
+    def get(self, wave_key, url):
+        """
+        Gets the WAVE json report for this URL, either from the cache,
+        from a call somebody else already has going, or by making a new one.
+
+        Input:
+            wave_key: the WAVE API key
+            url: a valid URL
+        Output:
+            the json response (as a dict)
+        """
+        key = (wave_key, url)
+
+        with self._lock:
+            content = self._get_cached(key)
+            if content is None:
+                call = self._in_flight.get(key)
+                leader = call is None
+                if leader:
+                    call = _Call()
+                    self._in_flight[key] = call
+
+        # cached reports are never changed, so the (slow) copy can happen
+        # without holding everybody else up
+        if content is not None:
+            return copy.deepcopy(content)
+
+        # somebody else is already asking WAVE about this URL; just wait
+        # for them to finish and share their answer
+        if not leader:
+            if not call.done.wait(self.wait_timeout):
+                raise Exception("gave up waiting on WAVE for %s" % url)
+            if call.error is not None:
+                # each thread gets its own exception (sharing one between
+                # threads mixes up the tracebacks)
+                raise Exception("WAVE call for %s failed: %s" % (
+                    url, call.error)) from call.error
+            return copy.deepcopy(call.content)
+
+        try:
+            if not self._semaphore.acquire(timeout=self.timeout):
+                raise Exception("too many WAVE calls in flight; gave up on %s" % url)
+            try:
+                call.content = self._request(wave_key, url)
+            finally:
+                self._semaphore.release()
+            with self._lock:
+                self._put_cached(key, call.content)
+        except BaseException as e:
+            # don't hand things like KeyboardInterrupt to the other threads,
+            # but make sure they know this call never finished
+            if isinstance(e, Exception):
+                call.error = e
+            else:
+                call.error = Exception("WAVE call for %s was interrupted" % url)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
+
+        return copy.deepcopy(call.content)
+
+    def clear(self):
+        """Throws away everything in the cache"""
+        with self._lock:
+            self._cache.clear()
+
+    def _request(self, wave_key, url):
+        """Actually sends the request off to WAVE"""
+        wave_url = self.WAVE_URL % (wave_key, url)
+        response = requests.get(wave_url, timeout=self.timeout)
+
+        if response.status_code != 200:
+            msg = "could not send URL to WAVE! Response: %s" % response.text
+            raise Exception(msg)
+
+        return response.json()
+
+    def _get_cached(self, key):
+        """Returns the cached content (or None). Call with the lock held."""
+        if key not in self._cache:
+            return None
+
+        expires_at, content = self._cache[key]
+        if time.monotonic() >= expires_at:
+            del self._cache[key]
+            return None
+
+        self._cache.move_to_end(key)
+        return content
+
+    def _put_cached(self, key, content):
+        """Adds to the cache, kicking out the oldest. Call with the lock held."""
+        if self.cache_ttl <= 0 or self.cache_size <= 0:
+            return
+
+        # WAVE says 200 even when it fails (bad key, out of credits, ...);
+        # don't keep those around
+        if not content.get('status', {}).get('success', False):
+            return
+
+        self._cache[key] = (time.monotonic() + self.cache_ttl, content)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+class _Call(object):
+    """Bookkeeping for one WAVE request that other threads can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.content = None
+        self.error = None
+
+
+# one client shared by every Checker, so concurrent handlers coalesce
+shared_client = WaveClient()
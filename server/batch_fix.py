@@ -0,0 +1,300 @@
+"""
+Command-line batch fixer for pages saved by Checker.check_and_save.
+
+Takes a directory of numbered <site_id>.html files plus the error CSV
+(keyed by site_id), runs Fixer.fix_all over every page in parallel worker
+processes, and writes the fixed pages and a per-page summary CSV to an
+output directory. Re-running with the same output directory picks up
+where it left off.
+
+Usage:
+    python batch_fix.py data data/sample_errors.csv fixed -j 8
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+
+# the checkpoint gets a row appended as each page finishes (so it can have
+# several rows per site); the summary is rebuilt from it with one row each
+CHECKPOINT_FILE = 'checkpoint.csv'
+SUMMARY_FILE = 'summary.csv'
+SUMMARY_COLS = ['site_id', 'url', 'num_errors', 'num_fixed', 'status',
+                'seconds', 'message', 'stylesheet', 'errors_hash']
+
+# each worker process gets its own Fixer (loading spacy is slow, so we only
+# want to do it once per process, not once per page)
+_fixer = None
+
+
+def _init_worker(contrast_stylesheet=False, verbose=False):
+    """Sets up the Fixer for this worker process"""
+    global _fixer
+    from Fixer import Fixer
+    _fixer = Fixer(contrast_stylesheet=contrast_stylesheet)
+
+    # fix_all prints a line per error; with lots of workers all fighting
+    # over one stdout that's mostly noise (and slows things down)
+    if not verbose:
+        sys.stdout = open(os.devnull, 'w')
+
+
+def _write_page(path, html):
+    """Writes to a temp file first so a crash never leaves half a page"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as fi:
+        fi.write(html)
+    os.replace(tmp_path, path)
+
+
+def _fix_page(job):
+    """
+    Fixes one page and writes it out. Runs inside a worker process.
+
+    Input:
+        job: tuple of (site_id, input html path, output html path, errors)
+    Output:
+        a tuple of (status, message, number of errors fixed, seconds)
+    """
+    site_id, in_path, out_path, errors = job
+    start = time.time()
+    num_fixed = 0
+
+    try:
+        with open(in_path, 'r', encoding='utf-8') as fo:
+            html = fo.read()
+
+        better_html, num_fixed = _fixer.fix_and_count(errors, html)
+        _write_page(out_path, better_html)
+
+        status, message = 'ok', ''
+    except Exception as e:
+        status, message = 'failed', str(e)
+
+    return status, message, num_fixed, round(time.time() - start, 3)
+
+
+def errors_hash(errors):
+    """
+    Fingerprints a site's errors, so we can tell if they changed since
+    the page was last fixed
+    """
+    text = json.dumps(errors, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def load_errors(error_file):
+    """
+    Loads the error CSV and groups it by site
+
+    Input:
+        error_file: path to a CSV written by Checker.check_and_save
+    Output:
+        a dict of site_id -> list of error dicts
+    """
+    dataset = pd.read_csv(error_file, index_col=0)
+    return {int(site_id): group.to_dict('records')
+            for site_id, group in dataset.groupby('site_id')}
+
+
+def find_pages(page_dir):
+    """
+    Finds all the numbered pages in the directory
+
+    Output:
+        a sorted list of (site_id, path)
+    """
+    pages = []
+    for name in os.listdir(page_dir):
+        match = re.fullmatch(r'(\d+)\.html', name)
+        if match:
+            pages.append((int(match.group(1)), os.path.join(page_dir, name)))
+    return sorted(pages)
+
+
+def load_checkpoint(checkpoint_path):
+    """
+    Reads the checkpoint to see what earlier runs already did
+
+    Output:
+        a dict of site_id -> the latest summary row for that site
+    """
+    if not os.path.exists(checkpoint_path):
+        return {}
+
+    with open(checkpoint_path, 'r', newline='', encoding='utf-8') as fo:
+        return {int(row['site_id']): row for row in csv.DictReader(fo)}
+
+
+def is_done(row, stylesheet, fingerprint):
+    """
+    Checks if a checkpoint row means the page is already fixed, with the
+    same options and the same errors we'd fix it with now
+    """
+    return (row is not None and row['status'] == 'ok' and
+            row.get('stylesheet') == str(stylesheet) and
+            row.get('errors_hash') == fingerprint)
+
+
+def write_summary(summary_path, rows):
+    """Writes the summary CSV (one row per site, sorted by site_id)"""
+    tmp_path = summary_path + '.tmp'
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as fi:
+        writer = csv.DictWriter(fi, fieldnames=SUMMARY_COLS,
+                                extrasaction='ignore')
+        writer.writeheader()
+        for site_id in sorted(rows):
+            writer.writerow(rows[site_id])
+    os.replace(tmp_path, summary_path)
+
+
+def batch_fix(page_dir, error_file, out_dir, workers=None,
+              contrast_stylesheet=False, verbose=False):
+    """
+    Fixes every saved page in page_dir, in parallel, skipping any pages
+    that a previous run already fixed with the same options and errors.
+
+    Pages with no rows in the error CSV are copied over as they are and
+    reported as 'no_errors', and sites in the CSV without a saved page are
+    reported as 'missing_page'. Neither goes in the checkpoint, since
+    they're worked out from scratch on every run.
+
+    Input:
+        page_dir: directory of <site_id>.html files
+        error_file: the error CSV keyed by site_id
+        out_dir: where to write fixed pages and the summary
+        workers: number of worker processes (defaults to the cpu count)
+        contrast_stylesheet: put contrast fixes in a <style> block instead
+            of inline styles (see ContrastFixer)
+        verbose: let the workers print their per-error progress
+    Output:
+        a list of summary dicts for the pages handled in this run
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    checkpoint_path = os.path.join(out_dir, CHECKPOINT_FILE)
+    summary_path = os.path.join(out_dir, SUMMARY_FILE)
+
+    all_errors = load_errors(error_file)
+    rows = load_checkpoint(checkpoint_path)
+    pages = find_pages(page_dir)
+
+    jobs = {}
+    results = []
+    skipped = 0
+    for site_id, in_path in pages:
+        out_path = os.path.join(out_dir, '%d.html' % site_id)
+
+        if site_id not in all_errors:
+            print("site %d: no errors in %s, copying as is" % (site_id, error_file))
+            with open(in_path, 'r', encoding='utf-8') as fo:
+                _write_page(out_path, fo.read())
+            results.append({
+                'site_id': site_id, 'url': '', 'num_errors': 0,
+                'num_fixed': 0, 'status': 'no_errors', 'seconds': 0.0,
+                'message': 'no rows in error file',
+            })
+            continue
+
+        errors = all_errors[site_id]
+        fingerprint = errors_hash(errors)
+        if is_done(rows.get(site_id), contrast_stylesheet, fingerprint):
+            skipped += 1
+            continue
+
+        jobs[site_id] = {
+            'site_id': site_id, 'url': errors[0]['url'],
+            'num_errors': len(errors), 'stylesheet': contrast_stylesheet,
+            'errors_hash': fingerprint,
+            'job': (site_id, in_path, out_path, errors),
+        }
+
+    page_ids = set(site_id for site_id, in_path in pages)
+    for site_id in sorted(set(all_errors) - page_ids):
+        print("site %d: no saved page in %s! Skipping" % (site_id, page_dir))
+        results.append({
+            'site_id': site_id, 'url': all_errors[site_id][0]['url'],
+            'num_errors': len(all_errors[site_id]), 'num_fixed': 0,
+            'status': 'missing_page', 'seconds': 0.0,
+            'message': 'no saved page',
+        })
+
+    print("%d pages to fix (%d already done)" % (len(jobs), skipped))
+
+    # append to the checkpoint (and flush) as soon as each page finishes,
+    # so a crash loses at most the pages that were still in progress
+    new_file = not os.path.exists(checkpoint_path)
+    with open(checkpoint_path, 'a', newline='', encoding='utf-8') as fi:
+        writer = csv.DictWriter(fi, fieldnames=SUMMARY_COLS,
+                                extrasaction='ignore')
+        if new_file:
+            writer.writeheader()
+
+        if len(jobs) > 0:
+            with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                     initargs=(contrast_stylesheet, verbose)) as pool:
+                futures = {pool.submit(_fix_page, info['job']): info
+                           for info in jobs.values()}
+                for future in as_completed(futures):
+                    result = dict(futures[future])
+                    del result['job']
+
+                    # if a worker dies outright (segfault, OOM kill, ...)
+                    # the pool is broken and every page still waiting on it
+                    # ends up here; they get retried on the next run
+                    try:
+                        status, message, num_fixed, seconds = future.result()
+                    except Exception as e:
+                        status, message, num_fixed, seconds = (
+                            'failed', 'worker died: %r' % e, 0, 0.0)
+                    result.update({'status': status, 'message': message,
+                                   'num_fixed': num_fixed, 'seconds': seconds})
+
+                    writer.writerow(result)
+                    fi.flush()
+                    results.append(result)
+                    print("site %d: %s, fixed %d of %d errors (%.2fs)" % (
+                        result['site_id'], result['status'], result['num_fixed'],
+                        result['num_errors'], result['seconds']))
+
+    # keep only the latest row for each site in the summary
+    for result in results:
+        rows[result['site_id']] = result
+    write_summary(summary_path, rows)
+
+    return results
+
+
+def _worker_count(value):
+    """argparse type for -j: has to be a whole number, at least 1"""
+    count = int(value)
+    if count < 1:
+        raise argparse.ArgumentTypeError("need at least 1 worker, got %s" % value)
+    return count
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Fix a directory of saved pages in parallel")
+    parser.add_argument('page_dir', help="directory of <site_id>.html files")
+    parser.add_argument('error_file', help="error CSV keyed by site_id")
+    parser.add_argument('out_dir', help="where to write the fixed pages")
+    parser.add_argument('-j', '--workers', type=_worker_count, default=None,
+                        help="number of worker processes (default: all cores)")
+    parser.add_argument('--stylesheet', action='store_true',
+                        help="fix contrast with shared CSS classes instead "
+                             "of inline styles")
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help="show the per-error progress from each worker")
+    args = parser.parse_args()
+
+    batch_fix(args.page_dir, args.error_file, args.out_dir, args.workers,
+              args.stylesheet, args.verbose)
@@ -0,0 +1,99 @@
+import unittest
+
+try:
+    from Fixer import Fixer
+except (ImportError, OSError): # needs spacy, spacy_langdetect and en_core_web_sm
+    Fixer = None
+
+
+PAGE = ('<html><head><title>t</title></head><body>'
+        '<p id="a">one</p><p id="b" style="margin: 0">two</p>'
+        '<span id="c">three</span></body></html>')
+
+
+def contrast(selector, fg, bg='#ffffff'):
+    """Makes a contrast error like the Checker would"""
+    return {'type': 'contrast', 'selector': selector, 'foreground': fg,
+            'background': bg, 'ratio': 2.0}
+
+
+@unittest.skipIf(Fixer is None, "Fixer needs spacy to be installed")
+class TestContrastFixer(unittest.TestCase):
+
+    def test_inline_output_is_unchanged(self):
+        errors = [contrast('#a', '#aaaaaa'),
+                  contrast('#b', '#777777', '#222222'),
+                  contrast('#c', '#aaaaaa')]
+
+        html = Fixer().fix_all(errors, PAGE)
+
+        self.assertEqual(html,
+            '<html><head><title>t</title></head><body>'
+            '<p id="a" style="color: hsl(0 0% 36%) !important;">one</p>'
+            '<p id="b" style="margin: 0;color: hsl(0 0% 76%) !important;">two</p>'
+            '<span id="c" style="color: hsl(0 0% 36%) !important;">three</span>'
+            '</body></html>')
+
+    def test_stylesheet_reuses_one_class_per_color(self):
+        errors = [contrast('#a', '#aaaaaa'), contrast('#c', '#aaaaaa')]
+
+        html = Fixer(contrast_stylesheet=True).fix_all(errors, PAGE)
+
+        self.assertIn('<p class="a11y-contrast-0" id="a">', html)
+        self.assertIn('<span class="a11y-contrast-0" id="c">', html)
+        self.assertEqual(html.count('<style>'), 1)
+        self.assertIn('html body .a11y-contrast-0.a11y-contrast-0 '
+                      '{ color: hsl(0 0% 36%) !important; }</style></head>', html)
+        self.assertNotIn('a11y-contrast-1', html)
+        self.assertNotIn('color: hsl', html.split('</head>')[1])
+
+    def test_stylesheet_falls_back_to_inline_important(self):
+        page = '<html><body><p id="a" style="COLOR:red!IMPORTANT">one</p></body></html>'
+
+        html = Fixer(contrast_stylesheet=True).fix_all(
+            [contrast('#a', '#aaaaaa')], page)
+
+        self.assertIn('style="COLOR:red!IMPORTANT;color: hsl(0 0% 36%) !important;"', html)
+        self.assertNotIn('a11y-contrast-', html)
+        self.assertNotIn('<style>', html)
+
+    def test_stylesheet_last_error_wins(self):
+        errors = [contrast('#a', '#aaaaaa'), contrast('#a', '#bbbbbb')]
+
+        html = Fixer(contrast_stylesheet=True).fix_all(errors, PAGE)
+
+        self.assertIn('<p class="a11y-contrast-1" id="a">', html)
+        # the replaced class doesn't get a rule
+        self.assertNotIn('a11y-contrast-0', html)
+
+    def test_stylesheet_makes_head_when_missing(self):
+        page = '<html><body><p id="a">one</p></body></html>'
+
+        html = Fixer(contrast_stylesheet=True).fix_all(
+            [contrast('#a', '#aaaaaa')], page)
+
+        self.assertTrue(html.startswith('<html><head><style>'))
+
+    def test_stylesheet_classes_dont_leak_across_pages(self):
+        fixer = Fixer(contrast_stylesheet=True)
+
+        # pretend the last page blew up before finish() ran
+        fixer.fixers['contrast']._classes = {'hsl(1 1% 1%)': 'a11y-contrast-0'}
+        html = fixer.fix_all([contrast('#b', '#777777', '#222222')], PAGE)
+
+        self.assertIn('<p class="a11y-contrast-0" id="b"', html)
+        self.assertIn('{ color: hsl(0 0% 76%) !important; }', html)
+        self.assertNotIn('hsl(1 1% 1%)', html)
+
+    def test_fix_and_count(self):
+        errors = [contrast('#a', '#aaaaaa'),
+                  contrast('#nope', '#aaaaaa'),  # selector no longer matches
+                  {'type': 'not_a_real_type', 'selector': '#c'}]
+
+        html, num_fixed = Fixer().fix_and_count(errors, PAGE)
+
+        self.assertEqual(num_fixed, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
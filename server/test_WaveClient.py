@@ -0,0 +1,149 @@
+import threading
+import time
+import unittest
+
+from WaveClient import WaveClient
+
+
+class FakeWave(object):
+    """Stands in for WaveClient._request so we never hit the real API"""
+
+    def __init__(self, delay=0.0, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, wave_key, url):
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            if self.error is not None:
+                raise self.error
+            return {'status': {'success': True}, 'url': url}
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def run_threads(target, args_list):
+    """Runs target once per args in its own thread; returns results/errors"""
+    results = [None] * len(args_list)
+
+    def run(i, args):
+        try:
+            results[i] = target(*args)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i, args))
+               for i, args in enumerate(args_list)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+class TestWaveClient(unittest.TestCase):
+
+    def test_concurrent_calls_are_merged(self):
+        client = WaveClient()
+        client._request = FakeWave(delay=0.2)
+
+        results = run_threads(client.get, [('key', 'a')] * 10)
+
+        self.assertEqual(client._request.calls, 1)
+        for result in results:
+            self.assertEqual(result['url'], 'a')
+
+    def test_callers_get_their_own_copy(self):
+        client = WaveClient()
+        client._request = FakeWave()
+
+        client.get('key', 'a')['url'] = 'changed'
+        self.assertEqual(client.get('key', 'a')['url'], 'a')
+
+    def test_errors_reach_every_waiter(self):
+        client = WaveClient()
+        client._request = FakeWave(delay=0.2, error=Exception("no credits"))
+
+        results = run_threads(client.get, [('key', 'a')] * 5)
+
+        self.assertEqual(client._request.calls, 1)
+        for result in results:
+            self.assertIsInstance(result, Exception)
+            self.assertIn("no credits", str(result))
+
+        # failures don't get cached
+        client._request = FakeWave()
+        self.assertEqual(client.get('key', 'a')['url'], 'a')
+
+    def test_waiters_get_their_own_exception(self):
+        client = WaveClient()
+        client._request = FakeWave(delay=0.2, error=Exception("no credits"))
+
+        results = run_threads(client.get, [('key', 'a')] * 5)
+
+        self.assertEqual(len(set(id(result) for result in results)), 5)
+
+    def test_waiters_give_up_after_wait_timeout(self):
+        client = WaveClient(wait_timeout=0.1)
+        client._request = FakeWave(delay=0.5)
+
+        results = run_threads(client.get, [('key', 'a')] * 3)
+
+        failed = [r for r in results if isinstance(r, Exception)]
+        self.assertEqual(len(failed), 2)
+        for result in failed:
+            self.assertIn("gave up waiting", str(result))
+
+    def test_concurrency_is_capped(self):
+        client = WaveClient(max_concurrent=2)
+        client._request = FakeWave(delay=0.1)
+
+        run_threads(client.get, [('key', str(i)) for i in range(6)])
+
+        self.assertEqual(client._request.calls, 6)
+        self.assertEqual(client._request.max_active, 2)
+
+    def test_zero_ttl_disables_cache(self):
+        client = WaveClient(cache_ttl=0)
+        client._request = FakeWave()
+
+        client.get('key', 'a')
+        client.get('key', 'a')
+
+        self.assertEqual(client._request.calls, 2)
+
+    def test_failed_reports_are_not_cached(self):
+        client = WaveClient()
+        client._request = lambda key, url: {'status': {'success': False}}
+
+        client.get('key', 'a')
+
+        self.assertEqual(len(client._cache), 0)
+
+    def test_lru_eviction_at_cache_size(self):
+        client = WaveClient(cache_size=2)
+        client._request = FakeWave()
+
+        client.get('key', 'a')
+        client.get('key', 'b')
+        client.get('key', 'a') # a is now the most recently used
+        client.get('key', 'c') # so b gets kicked out
+        self.assertEqual(client._request.calls, 3)
+
+        client.get('key', 'a')
+        self.assertEqual(client._request.calls, 3)
+        client.get('key', 'b')
+        self.assertEqual(client._request.calls, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,197 @@
+import csv
+import importlib.util
+import os
+import sys
+import tempfile
+import unittest
+
+import pandas as pd
+
+import batch_fix
+
+
+# stands in for the real Fixer (which needs spacy) inside the workers
+FAKE_FIXER = '''
+import os
+
+class Fixer(object):
+    def __init__(self, contrast_stylesheet=False):
+        self.contrast_stylesheet = contrast_stylesheet
+
+    def fix_and_count(self, errors, html):
+        if any(error['selector'] == 'crash' for error in errors):
+            os._exit(1)
+        if any(error['selector'] == 'explode' for error in errors):
+            raise Exception("boom")
+        num_fixed = len([e for e in errors if e['selector'] != 'gone'])
+        return 'fixed(%s) %s' % (self.contrast_stylesheet, html), num_fixed
+'''
+
+
+def error(site_id, selector='p'):
+    """Makes an error row like Checker.check_and_save would"""
+    return {'background': '#ffffff', 'foreground': '#aaaaaa', 'level': 'error',
+            'ratio': 2.0, 'selector': selector, 'type': 'contrast',
+            'site_id': site_id, 'url': 'https://example.com/%d' % site_id}
+
+
+class TestBatchFix(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = self._tmp.name
+        self.page_dir = os.path.join(self.tmp, 'pages')
+        self.out_dir = os.path.join(self.tmp, 'out')
+        self.error_file = os.path.join(self.tmp, 'errors.csv')
+        os.makedirs(self.page_dir)
+
+        # put the fake Fixer where the workers will find it, whether they
+        # get forked (sys.modules) or spawned (sys.path)
+        fixer_dir = os.path.join(self.tmp, 'fake')
+        os.makedirs(fixer_dir)
+        fixer_path = os.path.join(fixer_dir, 'Fixer.py')
+        with open(fixer_path, 'w') as fi:
+            fi.write(FAKE_FIXER)
+        spec = importlib.util.spec_from_file_location('Fixer', fixer_path)
+        fake = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(fake)
+
+        self._old_fixer = sys.modules.get('Fixer')
+        sys.modules['Fixer'] = fake
+        sys.path.insert(0, fixer_dir)
+        self.fixer_dir = fixer_dir
+
+    def tearDown(self):
+        sys.path.remove(self.fixer_dir)
+        if self._old_fixer is not None:
+            sys.modules['Fixer'] = self._old_fixer
+        else:
+            del sys.modules['Fixer']
+        self._tmp.cleanup()
+
+    def write_pages(self, *site_ids):
+        for site_id in site_ids:
+            path = os.path.join(self.page_dir, '%d.html' % site_id)
+            with open(path, 'w', encoding='utf-8') as fi:
+                fi.write('<p>page %d</p>' % site_id)
+
+    def write_errors(self, rows):
+        pd.DataFrame(rows).to_csv(self.error_file)
+
+    def run_batch(self, **kwargs):
+        return batch_fix.batch_fix(self.page_dir, self.error_file,
+                                   self.out_dir, workers=2, **kwargs)
+
+    def read_out(self, name):
+        with open(os.path.join(self.out_dir, name), encoding='utf-8') as fo:
+            return fo.read()
+
+    def read_csv(self, name):
+        with open(os.path.join(self.out_dir, name), newline='') as fo:
+            return list(csv.DictReader(fo))
+
+    def test_load_errors_groups_by_site(self):
+        self.write_errors([error(0), error(1), error(0, 'a')])
+
+        errors = batch_fix.load_errors(self.error_file)
+
+        self.assertEqual(sorted(errors), [0, 1])
+        self.assertEqual([e['selector'] for e in errors[0]], ['p', 'a'])
+        self.assertEqual(errors[1][0]['url'], 'https://example.com/1')
+
+    def test_find_pages_only_takes_numbered_html(self):
+        self.write_pages(10, 2)
+        for name in ['notes.html', '3.htm', 'errors.csv']:
+            open(os.path.join(self.page_dir, name), 'w').close()
+
+        pages = batch_fix.find_pages(self.page_dir)
+
+        self.assertEqual([site_id for site_id, path in pages], [2, 10])
+
+    def test_summary_keeps_latest_row_per_site(self):
+        os.makedirs(self.out_dir)
+        checkpoint = os.path.join(self.out_dir, batch_fix.CHECKPOINT_FILE)
+        with open(checkpoint, 'w', newline='') as fi:
+            writer = csv.DictWriter(fi, fieldnames=batch_fix.SUMMARY_COLS)
+            writer.writeheader()
+            writer.writerow({'site_id': 1, 'status': 'failed'})
+            writer.writerow({'site_id': 0, 'status': 'ok'})
+            writer.writerow({'site_id': 1, 'status': 'ok'})
+
+        rows = batch_fix.load_checkpoint(checkpoint)
+        summary = os.path.join(self.out_dir, batch_fix.SUMMARY_FILE)
+        batch_fix.write_summary(summary, rows)
+
+        self.assertEqual([(r['site_id'], r['status']) for r in self.read_csv(summary)],
+                         [('0', 'ok'), ('1', 'ok')])
+
+    def test_fixes_pages_and_reports_statuses(self):
+        self.write_pages(0, 1, 2, 3)
+        self.write_errors([error(0), error(0, 'gone'), error(1, 'explode'),
+                           error(3), error(4)])
+
+        self.run_batch()
+
+        summary = {r['site_id']: r for r in self.read_csv(batch_fix.SUMMARY_FILE)}
+        self.assertEqual({k: v['status'] for k, v in summary.items()},
+                         {'0': 'ok', '1': 'failed', '2': 'no_errors',
+                          '3': 'ok', '4': 'missing_page'})
+        self.assertEqual((summary['0']['num_errors'], summary['0']['num_fixed']),
+                         ('2', '1'))
+        self.assertEqual(self.read_out('0.html'), 'fixed(False) <p>page 0</p>')
+        # pages with no errors still get copied over
+        self.assertEqual(self.read_out('2.html'), '<p>page 2</p>')
+        self.assertFalse(os.path.exists(os.path.join(self.out_dir, '1.html')))
+
+        # only the pages the workers ran go in the checkpoint
+        checkpoint = self.read_csv(batch_fix.CHECKPOINT_FILE)
+        self.assertEqual(sorted(r['site_id'] for r in checkpoint), ['0', '1', '3'])
+
+    def test_resume_only_redoes_what_is_needed(self):
+        self.write_pages(0, 1, 2)
+        self.write_errors([error(0), error(1, 'explode'), error(5)])
+        self.run_batch()
+
+        # the failed page gets retried, the missing one isn't checkpointed
+        results = self.run_batch()
+        self.assertEqual([r['site_id'] for r in results
+                          if r['status'] in ['ok', 'failed']], [1])
+        checkpoint = self.read_csv(batch_fix.CHECKPOINT_FILE)
+        self.assertEqual(sorted(r['site_id'] for r in checkpoint), ['0', '1', '1'])
+        self.assertEqual(len(self.read_csv(batch_fix.SUMMARY_FILE)), 4)
+
+        # a site that gets errors later is picked up, and so is one whose
+        # errors changed
+        self.write_errors([error(0, 'a'), error(1, 'explode'), error(2), error(5)])
+        results = self.run_batch()
+        self.assertEqual(sorted(r['site_id'] for r in results
+                                if r['status'] in ['ok', 'failed']), [0, 1, 2])
+
+    def test_changing_options_redoes_pages(self):
+        self.write_pages(0)
+        self.write_errors([error(0)])
+        self.run_batch()
+
+        results = self.run_batch(contrast_stylesheet=True)
+
+        self.assertEqual([r['status'] for r in results], ['ok'])
+        self.assertEqual(self.read_out('0.html'), 'fixed(True) <p>page 0</p>')
+
+    def test_dead_worker_fails_page_instead_of_hanging(self):
+        self.write_pages(0)
+        self.write_errors([error(0, 'crash')])
+
+        results = self.run_batch()
+
+        self.assertEqual(results[0]['status'], 'failed')
+        self.assertIn('worker died', results[0]['message'])
+
+    def test_worker_count_must_be_positive(self):
+        self.assertEqual(batch_fix._worker_count('3'), 3)
+        for value in ['0', '-2']:
+            with self.assertRaises(Exception):
+                batch_fix._worker_count(value)
+
+
+if __name__ == "__main__":
+    unittest.main()